@@ -287,7 +287,9 @@ class BinaryInceptionLoss(nn.BCEWithLogitsLoss):
         if len(input) != 3:
             raise ValueError(f'Input tensor must have 3 elements, but got {len(input)}')
         
-        out_aux1, out_aux2, out_main = input
+        # float32 reductions, half precision logits (mixed precision) can overflow or lose precision
+        out_aux1, out_aux2, out_main = (out.float() for out in input)
+        target = target.float()
         loss_aux1 = super().forward(out_aux1, target)
         loss_aux2 = super().forward(out_aux2, target)
         loss_main = super().forward(out_main, target)
@@ -8,6 +8,7 @@ import torch
 from torch.utils.data import DataLoader, random_split
 from torchvision.datasets import ImageFolder
 from torchvision import transforms
+from utils.loader_config import get_loader_kwargs
 import warnings
 
 warnings.filterwarnings("ignore")
@@ -155,13 +156,16 @@ class FakeDetectorPreprocessor:
                      val_size: float = 0.15,
                      n_workers: int = 4,
                      batch_size: int = 64,
-                     use_weighted_sampling: bool = False) -> None:
+                     use_weighted_sampling: bool = False,
+                     drop_last: bool = False) -> None:
         """
         Prepare the data for training, validation and testing, computing transformations
         and creating the DataLoader objects.
 
         Args:
             n_workers (int): Number of workers for the DataLoaders.
+            drop_last (bool): Whether to drop the last incomplete training batch, keeps a
+                static batch size for compiled models.
         """
         if self.__processed:
             warnings.warn('You will overwrite the processed data.')
@@ -186,6 +190,8 @@ class FakeDetectorPreprocessor:
         val_dataset.dataset.transform = self.test_transforms
         test_dataset.dataset.transform = self.test_transforms
 
+        loader_kwargs = get_loader_kwargs(n_workers)
+
         if use_weighted_sampling:
             train_targets = [dataset.targets[i] for i in train_dataset.indices]
             
@@ -197,11 +203,13 @@ class FakeDetectorPreprocessor:
             sample_weights = torch.tensor([weights[target] for target in train_targets])
             sampler = WeightedRandomSampler(weights=sample_weights, num_samples=len(sample_weights), replacement=True)
 
-            self.train_loader = DataLoader(train_dataset, batch_size=batch_size, sampler=sampler, num_workers=n_workers)
+            self.train_loader = DataLoader(train_dataset, batch_size=batch_size, sampler=sampler, drop_last=drop_last,
+                                           **loader_kwargs)
         else:
-            self.train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, num_workers=n_workers)
+            self.train_loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, drop_last=drop_last,
+                                           **loader_kwargs)
 
-        self.val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False, num_workers=n_workers)
-        self.test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=False, num_workers=n_workers)  
+        self.val_loader = DataLoader(val_dataset, batch_size=batch_size, shuffle=False, **loader_kwargs)
+        self.test_loader = DataLoader(test_dataset, batch_size=batch_size, shuffle=False, **loader_kwargs)  
 
         self.__processed = True      
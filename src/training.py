@@ -1,26 +1,113 @@
+import contextlib
 import datetime
-from typing import Callable, Dict, List, Optional, Union
+import inspect
+import os
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Type, Union
 import torch
+import torch.distributed as dist
 import torch.nn as nn
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data.distributed import DistributedSampler
 from torch.utils.tensorboard import SummaryWriter
 from utils.logger_config import get_logger
+from utils.loader_config import PREFETCH_FACTOR, get_loader_kwargs
 from src.models.inception import BinaryInceptionLoss
 from tqdm.auto import tqdm
 
 logger = get_logger()
 
+class _CudaPrefetcher:
+    """
+    Iterator over a DataLoader that copies the next batch to the device on a
+    dedicated CUDA stream while the current batch is being processed. Image
+    batches are converted to the channels last memory format.
+    """
+
+    loader: Iterator
+    device: str
+    stream: torch.cuda.Stream
+    current_stream: torch.cuda.Stream
+    next_x: Optional[torch.Tensor]
+    next_y: Optional[torch.Tensor]
+
+    def __init__(self,
+                 data_loader: torch.utils.data.DataLoader,
+                 device: str) -> None:
+        """
+        Constructor for the _CudaPrefetcher class.
+
+        Args:
+            data_loader: Loader to prefetch from
+            device: CUDA device to copy the batches to
+        """
+
+        self.loader = iter(data_loader)
+        self.device = device
+        self.stream = torch.cuda.Stream(device=device)
+        # stream of the target device, which may not be the current device
+        self.current_stream = torch.cuda.current_stream(device)
+        self._preload()
+
+    def _preload(self) -> None:
+        """
+        Start the asynchronous copy of the next batch on the side stream.
+        """
+
+        try:
+            x, y = next(self.loader)
+        except StopIteration:
+            self.next_x, self.next_y = None, None
+            return
+
+        with torch.cuda.stream(self.stream):
+            self.next_x = x.to(self.device, non_blocking=True)
+            self.next_y = y.to(self.device, non_blocking=True)
+            if self.next_x.dim() == 4:
+                self.next_x = self.next_x.to(memory_format=torch.channels_last)
+
+    def __iter__(self) -> "_CudaPrefetcher":
+        return self
+
+    def __next__(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Wait for the pending copy and return the batch, then start copying the next one.
+
+        Returns:
+            Tuple[torch.Tensor, torch.Tensor]: Input and target data on the device
+        """
+
+        self.current_stream.wait_stream(self.stream)
+        x, y = self.next_x, self.next_y
+        if x is None:
+            raise StopIteration
+
+        # the tensors were allocated on the side stream but are consumed on the current one
+        x.record_stream(self.current_stream)
+        y.record_stream(self.current_stream)
+        self._preload()
+        return x, y
+
 class FakeDetectorTrainer:
     """
     Class for training the FakeDetector model.
     """
 
     model: nn.Module
-    optimizer: torch.optim.Optimizer
+    optimizer: Optional[torch.optim.Optimizer]
+    optimizer_spec: Optional[Tuple[Type[torch.optim.Optimizer], Dict[str, Any]]]
     train_loss_fn: torch.nn.modules.loss.BCEWithLogitsLoss
     val_loss_fn: Union[torch.nn.modules.loss.BCEWithLogitsLoss, BinaryInceptionLoss]
     n_labels: int
-    train_step: float
-    val_step: float
+    device_type: str
+    use_cuda: bool
+    use_amp: bool
+    amp_dtype: torch.dtype
+    scaler: torch.amp.GradScaler
+    scaler_state: Optional[Dict[str, Any]]
+    accum_steps: int
+    distributed: bool
+    local_rank: int
+    compiled: bool
     train_loader: torch.utils.data.DataLoader
     val_loader: Optional[torch.utils.data.DataLoader]
     writer: Optional[SummaryWriter]
@@ -31,28 +118,45 @@ class FakeDetectorTrainer:
 
     def __init__(self,
                  model: nn.Module,
-                 optimizer: torch.optim.Optimizer,
+                 optimizer: Union[torch.optim.Optimizer, Type[torch.optim.Optimizer]],
                  train_loss_fn: torch.nn.modules.loss.BCEWithLogitsLoss,
-                 val_loss_fn: Optional[Union[torch.nn.modules.loss.BCEWithLogitsLoss, BinaryInceptionLoss]]) -> None:
+                 val_loss_fn: Optional[Union[torch.nn.modules.loss.BCEWithLogitsLoss, BinaryInceptionLoss]],
+                 optimizer_kwargs: Optional[Dict[str, Any]] = None) -> None:
         """
         Constructor for the FakeDetectorTrainer class.
 
         Args:
             model: FakeDetector model
-            optimizer: Optimizer
+            optimizer: Optimizer, or optimizer class built with `make_optimizer` by `to` once
+                the model is on its device (to use fused kernels on CUDA)
             train_loss_fn: Loss function for training
             val_loss_fn: Loss function for validation
+            optimizer_kwargs: Arguments of the optimizer when a class is given
         """
 
         self.model = model
-        self.optimizer = optimizer
+        if isinstance(optimizer, type):
+            self.optimizer_spec = (optimizer, optimizer_kwargs or {})
+            self.optimizer = None
+        else:
+            self.optimizer_spec = None
+            self.optimizer = optimizer
         self.train_loss_fn = train_loss_fn
         self.val_loss_fn = val_loss_fn
         self.n_labels = 1
-        self.train_step = self._make_train_step()
-        self.val_step = self._make_val_step()
+        self.device_type = "cpu"
+        self.use_cuda = False
+        self.use_amp = False
+        self.amp_dtype = torch.bfloat16
+        self.scaler = torch.amp.GradScaler("cuda", enabled=False)
+        self.scaler_state = None
+        self.accum_steps = 1
+        self.distributed = False
+        self.local_rank = 0
+        self.compiled = False
 
         # placeholders
+        self.device = "cpu"
         self.train_loader = None
         self.val_loader = None
         self.writer = None
@@ -63,13 +167,28 @@ class FakeDetectorTrainer:
         self.gradients = {}
 
     def to(self,
-           device: str) -> None:
+           device: str,
+           compile_model: Optional[bool] = None) -> None:
         """
-        Set the device for training.
+        Set the device for training and compile the model. On CUDA devices, mixed
+        precision is enabled (bfloat16 autocast when supported, float16 autocast with
+        gradient scaling otherwise) and the model uses the channels last memory format.
+        After `init_distributed`, the model is wrapped with DistributedDataParallel.
+
+        On CUDA, the model is compiled with `torch.compile` (mode "reduce-overhead") when
+        available. The first iterations after compilation are slower (up to tens of seconds)
+        because the graphs are traced and compiled, the following steps reuse them. If the
+        compilation fails, the eager model is used instead.
 
         Args:
             device: Device for training
+            compile_model: If the model should be compiled with `torch.compile`, defaults to
+                compiling on CUDA only (on CPU, Inductor needs a working C++ toolchain)
         """
+
+        if self.distributed and torch.device(device).type == "cuda":
+            # each process trains on the GPU of its local rank
+            device = f"cuda:{self.local_rank}"
         
         try:
             self.device = device
@@ -78,26 +197,249 @@ class FakeDetectorTrainer:
             self.device = 'cuda' if torch.cuda.is_available() else 'cpu'
             logger.warning(f"Device {device} not found. Using {self.device} instead.")
             self.model.to(self.device)
+
+        # resolved once, the training loop branches on these flags
+        self.device_type = torch.device(self.device).type
+        self.use_cuda = self.device_type == "cuda"
+        self.use_amp = self.use_cuda
+        # bfloat16 has the float32 range, no loss scaling is needed (Ampere and newer),
+        # it is also the autocast dtype supported on every device type
+        self.amp_dtype = torch.float16 if self.use_cuda and not torch.cuda.is_bf16_supported() else torch.bfloat16
+
+        if self.use_cuda:
+            self.model = self.model.to(memory_format=torch.channels_last)
+
+        # built once, when the parameters are on the device
+        if self.optimizer is None:
+            optimizer_cls, optimizer_kwargs = self.optimizer_spec
+            self.optimizer = self.make_optimizer(self._base_model(), optimizer_cls, **optimizer_kwargs)
+
+        if self.use_cuda and not self.optimizer.defaults.get("fused"):
+            logger.info("The optimizer does not use fused kernels. Pass the optimizer class to the trainer, "
+                        "or build it with `FakeDetectorTrainer.make_optimizer` after moving the model to CUDA.")
+
+        # keep the loss scale across calls, and apply a state loaded while the scaler was disabled
+        scaler_state = self.scaler.state_dict() or self.scaler_state
+        self.scaler = torch.amp.GradScaler("cuda", enabled=self.use_amp and self.amp_dtype == torch.float16)
+        if scaler_state and self.scaler.is_enabled():
+            self.scaler.load_state_dict(scaler_state)
+        self.scaler_state = None if self.scaler.is_enabled() else scaler_state
+
+        model = self._base_model()
+        if self.distributed:
+            device_ids = [self.local_rank] if self.use_cuda else None
+            model = DistributedDataParallel(model, device_ids=device_ids)
+        self.model = model
+        self.compiled = False
+
+        if compile_model is None:
+            compile_model = self.use_cuda
+
+        if compile_model and hasattr(torch, "compile"):
+            try:
+                self.model = torch.compile(model, mode="reduce-overhead", 
+                                           fullgraph=False, backend="inductor")
+                self.compiled = True
+            except Exception as e:
+                logger.warning(f"Model compilation failed ({e}). Using the eager model instead.")
+
+    def _forward(self,
+                 x: torch.Tensor) -> Union[torch.Tensor, Tuple[torch.Tensor, ...]]:
+        """
+        Forward pass of the model. `torch.compile` compiles lazily, so compilation errors
+        are raised by the calls of the compiled model: in that case the eager model is
+        restored and the call is run again with it. Other errors are raised as is.
+
+        Args:
+            x: Input data
+
+        Returns:
+            Union[torch.Tensor, Tuple[torch.Tensor, ...]]: Output of the model
+        """
+
+        if not self.compiled:
+            return self.model(x)
+
+        try:
+            return self.model(x)
+        except torch._dynamo.exc.TorchDynamoException as e:
+            # also covers Inductor failures, raised as BackendCompilerFailed
+            self.model = self.model._orig_mod
+            self.compiled = False
+            logger.warning(f"Model compilation failed ({e}). Using the eager model instead.")
+            return self.model(x)
+
+    def _base_model(self) -> nn.Module:
+        """
+        Get the underlying eager model, without the `torch.compile` and
+        DistributedDataParallel wrappers.
+
+        Returns:
+            nn.Module: Underlying model
+        """
+
+        model = getattr(self.model, "_orig_mod", self.model)
+        if isinstance(model, DistributedDataParallel):
+            model = model.module
+        return model
+
+    def init_distributed(self,
+                         backend: str = "nccl") -> None:
+        """
+        Initialize the process group for distributed data parallel training. It must be
+        called before `to`, in a process launched with `torchrun` (one process per GPU).
+        A CUDA device given to `to` is then replaced by the GPU of the local rank.
+
+        Args:
+            backend: Backend of the process group
+        """
+
+        self.local_rank = int(os.environ.get("LOCAL_RANK", 0))
+        dist.init_process_group(backend=backend)
+        if torch.cuda.is_available():
+            torch.cuda.set_device(self.local_rank)
+        self.distributed = True
+
+        logger.info(f"Process group initialized. Rank {dist.get_rank()} of {dist.get_world_size()}.")
+
+    def _require_optimizer(self) -> None:
+        """
+        Check that the optimizer is built, an optimizer given as a class is built by `to`.
+        """
+
+        if self.optimizer is None:
+            raise ValueError("Optimizer not built yet. Call `to` before training, saving or loading the model.")
+
+    def _is_main_process(self) -> bool:
+        """
+        Check if the current process is the main one (rank 0), or if training is not distributed.
+
+        Returns:
+            bool: If the current process is the main one
+        """
+
+        return not self.distributed or dist.get_rank() == 0
+
+    def _grad_sync(self,
+                   sync: bool) -> contextlib.AbstractContextManager:
+        """
+        Context for the forward and backward passes, skips the gradient all-reduce
+        of DistributedDataParallel while gradients are being accumulated.
+
+        Args:
+            sync: If the gradients are synchronized across processes
+
+        Returns:
+            contextlib.AbstractContextManager: Synchronization context
+        """
+
+        model = getattr(self.model, "_orig_mod", self.model)
+        if sync or not isinstance(model, DistributedDataParallel):
+            return contextlib.nullcontext()
+        return model.no_sync()
     
     @staticmethod
-    def set_seed(seed: int = 42) -> None:
+    def make_optimizer(model: nn.Module,
+                       cls: Type[torch.optim.Optimizer] = torch.optim.AdamW,
+                       fused: bool = True,
+                       **kwargs: Any) -> torch.optim.Optimizer:
         """
-        Set the seed for reproducibility.
+        Build an optimizer using its multi-tensor implementation: fused kernels when the
+        parameters are on CUDA and the optimizer supports them, `foreach` otherwise. The
+        model must already be on its training device.
+
+        Args:
+            model: Model to optimize
+            cls: Optimizer class
+            fused: If the fused implementation is used on CUDA
+            kwargs: Arguments of the optimizer (learning rate, weight decay...)
+
+        Returns:
+            torch.optim.Optimizer: Optimizer
+        """
+
+        supported = inspect.signature(cls.__init__).parameters
+        # fused and foreach are exclusive, an explicit foreach from the caller wins
+        if (fused and "fused" in supported and "foreach" not in kwargs
+                and all(param.is_cuda for param in model.parameters())):
+            kwargs.setdefault("fused", True)
+        elif "foreach" in supported:
+            kwargs.setdefault("foreach", True)
+
+        return cls(model.parameters(), **kwargs)
+
+    @staticmethod
+    def set_seed(seed: int = 42,
+                 deterministic: bool = False) -> None:
+        """
+        Set the seed for reproducibility. By default cuDNN benchmarks the convolution
+        algorithms and picks the fastest one for each input shape, which is faster but
+        not bit-exact between runs. Use `deterministic` for exactly reproducible runs.
 
         Args:
             seed: Seed
+            deterministic: If cuDNN must use deterministic algorithms
         """
 
-        torch.backends.cudnn.deterministic = True
-        torch.backends.cudnn.benchmark = False
+        torch.backends.cudnn.deterministic = deterministic
+        torch.backends.cudnn.benchmark = not deterministic
         torch.manual_seed(seed)
         torch.cuda.manual_seed_all(seed)
         
+    @staticmethod
+    def build_loaders(train_dataset: torch.utils.data.Dataset,
+                      val_dataset: Optional[torch.utils.data.Dataset] = None,
+                      batch_size: int = 64,
+                      num_workers: Optional[int] = None,
+                      prefetch_factor: int = PREFETCH_FACTOR,
+                      sampler: Optional[torch.utils.data.Sampler] = None,
+                      drop_last: bool = False
+                      ) -> Tuple[torch.utils.data.DataLoader, Optional[torch.utils.data.DataLoader]]:
+        """
+        Build the train and validation loaders with persistent workers, a larger prefetch
+        factor and pinned memory when CUDA is available.
+
+        Args:
+            train_dataset: Train dataset
+            val_dataset: Validation dataset
+            batch_size: Batch size
+            num_workers: Number of workers for each loader, defaults to min(8, number of CPUs)
+            prefetch_factor: Number of batches loaded in advance by each worker
+            sampler: Sampler for the train loader, the train dataset is shuffled if not provided
+            drop_last: If the last incomplete train batch is dropped, keeps a static batch size
+                for compiled models
+
+        Returns:
+            Tuple[DataLoader, Optional[DataLoader]]: Train and validation loaders
+        """
+
+        if num_workers is None:
+            num_workers = min(8, os.cpu_count() or 1)
+
+        loader_kwargs = get_loader_kwargs(num_workers, prefetch_factor)
+        loader_kwargs["batch_size"] = batch_size
+
+        train_loader = torch.utils.data.DataLoader(train_dataset, sampler=sampler, shuffle=sampler is None,
+                                                   drop_last=drop_last, **loader_kwargs)
+        val_loader = None
+        if val_dataset is not None:
+            val_loader = torch.utils.data.DataLoader(val_dataset, shuffle=False, **loader_kwargs)
+
+        return train_loader, val_loader
+
     def set_loaders(self,
                     train_loader: torch.utils.data.DataLoader,
                     val_loader: Optional[torch.utils.data.DataLoader] = None) -> None:
         """
-        Set the train and validation loaders.
+        Set the train and validation loaders. When CUDA is available, the loaders should
+        be built with `pin_memory=True` so host to device copies can run asynchronously.
+        With a compiled model, the train loader should use `drop_last=True`: the batch
+        size is kept static for CUDA graphs, so a shorter last batch triggers a recompilation.
+        The same holds for a validation loader whose size is not a multiple of the batch size,
+        its last batch is compiled and recorded separately (once, then reused).
+        In distributed training, the train loader needs a DistributedSampler. The validation
+        loader should have one too, otherwise every process runs the full validation set.
+        The reported losses are averaged over the processes.
 
         Args:
             train_loader: Train loader
@@ -116,81 +458,106 @@ class FakeDetectorTrainer:
         if len(train_loader.dataset.dataset.classes) != self.n_labels + 1:
             raise ValueError(f"Number of labels in the dataset ({len(train_loader.dataset.dataset.classes)})"
                              f"does not match the number of labels in the model ({self.n_labels + 1}).")
+
+        if self.distributed and not isinstance(train_loader.sampler, DistributedSampler):
+            raise ValueError("Distributed training requires a train loader with a DistributedSampler.")
+
+        if self.distributed and val_loader is not None and not isinstance(val_loader.sampler, DistributedSampler):
+            logger.warning("Validation loader has no DistributedSampler, validation is not sharded: "
+                           "every process runs the full validation set.")
+
+        for name, loader in (("Train", train_loader), ("Validation", val_loader)):
+            if loader is None:
+                continue
+            if torch.cuda.is_available() and not loader.pin_memory:
+                logger.warning(f"{name} loader does not use pinned memory. "
+                               "Build it with `pin_memory=True` for asynchronous host to device copies.")
+            if loader.num_workers > 0 and not loader.persistent_workers:
+                logger.warning(f"{name} loader respawns its workers every epoch. "
+                               "Build it with `persistent_workers=True` (see `build_loaders`).")
           
     def set_tensorboard(self,
                         name: str,
                         log_dir: str = "runs") -> None:
         """
-        Set the tensorboard.
+        Set the tensorboard. In distributed training, only the main process writes logs.
 
         Args:
             name: Name of the tensorboard
             log_dir: Directory for the tensorboard
         """
 
+        if not self._is_main_process():
+            return
+
         suffix = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
         self.writer = SummaryWriter(log_dir=f"{log_dir}/{name}_{suffix}")
 
     
-    def _make_train_step(self) -> float:
+    def train_step(self,
+                   x: torch.Tensor, 
+                   y: torch.Tensor,
+                   update: bool = True,
+                   group_size: Optional[int] = None) -> torch.Tensor:
         """
-        Make a train step.
+        Train step. The gradients are accumulated until a step with `update`
+        set, which applies them with the optimizer.
+
+        Args:
+            x: Input data
+            y: Target data
+            update: If the optimizer step is applied after the backward pass
+            group_size: Number of mini batches accumulated for the optimizer step,
+                defaults to `accum_steps`
 
         Returns:
-            function: Train step function
+            torch.Tensor: Loss, detached and kept on the device
         """
 
-        def train_step(x: torch.Tensor, 
-                       y: torch.Tensor) -> float:
-            """
-            Train step.
-
-            Args:
-                x: Input data
-                y: Target data
-
-            Returns:
-                float: Loss
-            """
-
-            self.model.train()
-            self.optimizer.zero_grad()
-            yhat = self.model(x)
-            loss = self.train_loss_fn(yhat, y)
-            loss.backward()
-            self.optimizer.step()
-            return loss.item()
-
-        return train_step
+        if self.compiled and self.use_cuda:
+            # static batch size, required for CUDA graphs
+            torch._dynamo.mark_static(x, 0)
+
+        with self._grad_sync(update):
+            with torch.autocast(device_type=self.device_type, dtype=self.amp_dtype, enabled=self.use_amp):
+                yhat = self._forward(x)
+                loss = self.train_loss_fn(yhat, y)
+            self.scaler.scale(loss / (group_size or self.accum_steps)).backward()
+        if update:
+            self._optimizer_step()
+        return loss.detach()
     
-    def _make_val_step(self) -> float:
+    def _optimizer_step(self) -> None:
+        """
+        Apply the accumulated gradients and reset them.
         """
-        Make a validation step.
 
-        Returns:
-            function: Validation step function
+        self.scaler.step(self.optimizer)
+        self.scaler.update()
+        self.optimizer.zero_grad(set_to_none=True)
+
+    def val_step(self,
+                 x: torch.Tensor, 
+                 y: torch.Tensor) -> torch.Tensor:
         """
+        Validation step.
 
-        def val_step(x: torch.Tensor, 
-                     y: torch.Tensor) -> float:
-            """
-            Validation step.
+        Args:
+            x: Input data
+            y: Target data
 
-            Args:
-                x: Input data
-                y: Target data
+        Returns:
+            torch.Tensor: Loss, detached and kept on the device
+        """
 
-            Returns:
-                float: Loss
-            """
+        if self.compiled and self.use_cuda:
+            torch._dynamo.mark_static(x, 0)
 
-            self.model.eval()
-            with torch.no_grad():
-                yhat = self.model(x)
+        with torch.inference_mode():
+            with torch.autocast(device_type=self.device_type, dtype=self.amp_dtype, enabled=self.use_amp):
+                yhat = self._forward(x)
                 loss = self.val_loss_fn(yhat, y)
-                return loss.item()
-
-        return val_step
+            return loss.detach()
 
     def _mini_batch(self,
                     validation: bool = False) -> float:
@@ -214,86 +581,168 @@ class FakeDetectorTrainer:
 
         if data_loader is None:
             return None
-        
-        mini_batch_loss = 0.0
-        for x, y in data_loader:
-            x, y = x.to(self.device), y.to(self.device)
 
-            mini_batch_loss += step(x, y)
+        n_batches = len(data_loader)
+        if n_batches == 0:
+            name = "Validation" if validation else "Train"
+            raise ValueError(f"{name} loader has no batches, its dataset may be smaller than the batch size.")
+
+        # set once per loop rather than in every step, it walks the whole module tree
+        if validation:
+            self.model.eval()
+        else:
+            self.model.train()
+            self.optimizer.zero_grad(set_to_none=True)
+        
+        if self.use_cuda:
+            batches = _CudaPrefetcher(data_loader, self.device)
+        else:
+            batches = ((x.to(self.device), y.to(self.device)) for x, y in data_loader)
+
+        # accumulated on the device, synchronized once at the end of the loop
+        mini_batch_loss = torch.zeros((), device=self.device)
+        for i, (x, y) in enumerate(batches, 1):
+            if validation:
+                mini_batch_loss += step(x, y)
+            else:
+                # the last mini batch closes the incomplete accumulation, its gradients are synchronized
+                update = i % self.accum_steps == 0 or i == n_batches
+                group_start = (i - 1) // self.accum_steps * self.accum_steps
+                group_size = min(self.accum_steps, n_batches - group_start)
+                mini_batch_loss += step(x, y, update, group_size)
         
-        return mini_batch_loss / len(data_loader)
+        mini_batch_loss /= n_batches
+        if self.distributed:
+            # each process only saw its shard, the loss is averaged over all of them
+            dist.all_reduce(mini_batch_loss)
+            mini_batch_loss /= dist.get_world_size()
+
+        return mini_batch_loss.item()
     
     def train(self,
               n_epochs: int,
-              seed: int = 42) -> None:
+              seed: int = 42,
+              accum_steps: int = 1,
+              deterministic: bool = False,
+              tb_flush_every: int = 1) -> None:
         """
         Train the model.
 
         Args:
             n_epochs: Number of epochs
             seed: Seed for reproducibility
+            accum_steps: Number of mini batches accumulated before each optimizer step,
+                the effective batch size is `accum_steps` times the loader batch size
+            deterministic: If cuDNN must use deterministic algorithms (see `set_seed`)
+            tb_flush_every: Number of epochs between two flushes of the tensorboard writer
         """
 
-        self.set_seed(seed)
+        self._require_optimizer()
+        if accum_steps < 1:
+            raise ValueError(f"accum_steps must be at least 1, but got {accum_steps}.")
+        if tb_flush_every < 1:
+            raise ValueError(f"tb_flush_every must be at least 1, but got {tb_flush_every}.")
+
+        self.set_seed(seed, deterministic)
+        self.accum_steps = accum_steps
+
+        if self.compiled and not self.train_loader.drop_last:
+            logger.warning("Train loader keeps its last incomplete batch, the compiled model will be "
+                           "recompiled for it. Build it with `drop_last=True`.")
         
         logger.info(f"Training for {n_epochs} epochs. {self.total_epochs} epochs have already been trained.")
 
-        for epoch in tqdm(range(n_epochs)):
-            self.total_epochs += 1
-
-            train_loss = self._mini_batch()
-            self.losses.append(train_loss)
+        losses_start, val_losses_start = len(self.losses), len(self.val_losses)
+        self.losses.extend([None] * n_epochs)
+        self.val_losses.extend([None] * n_epochs)
+        trained_epochs = 0
 
-            with torch.inference_mode():
-                val_loss = self._mini_batch(validation=True)
-                self.val_losses.append(val_loss)
+        try:
+            for epoch in tqdm(range(n_epochs)):
+                self.total_epochs += 1
+
+                if self.distributed:
+                    self.train_loader.sampler.set_epoch(self.total_epochs)
+
+                train_loss = self._mini_batch()
+                self.losses[losses_start + epoch] = train_loss
+
+                with torch.inference_mode():
+                    val_loss = self._mini_batch(validation=True)
+                    self.val_losses[val_losses_start + epoch] = val_loss
+                trained_epochs += 1
+
+                if self.writer:
+                    scalars = {"loss/train": train_loss}
+                    if val_loss:
+                        scalars["loss/val"] = val_loss
+                    self.writer.add_scalars("loss", scalars, epoch)
+                    if (epoch + 1) % tb_flush_every == 0:
+                        self.writer.flush()
+
+                if self.use_cuda:
+                    # return the blocks freed during the epoch, limits fragmentation on long runs
+                    torch.cuda.empty_cache()
+        finally:
+            # drop the slots of the epochs that did not complete, if training was interrupted
+            del self.losses[losses_start + trained_epochs:]
+            del self.val_losses[val_losses_start + trained_epochs:]
 
             if self.writer:
-                scalars = {"loss/train": train_loss}
-                if val_loss:
-                    scalars["loss/val"] = val_loss
-                self.writer.add_scalars("loss", scalars, epoch)
+                self.writer.flush()
         
         logger.info(f"Training completed. {n_epochs} epochs trained. Total epochs trained: {self.total_epochs}")
 
-        if self.writer:
-            self.writer.flush()
-
     def save_model(self,
                    path: str) -> None:
         """
-        Save the model.
+        Save the model. In distributed training, only the main process saves it.
     
         Args:
             path: Path to save the model
         """
-    
+
+        if not self._is_main_process():
+            return
+
+        self._require_optimizer()
         checkpoint = {
-            "model": self.model.state_dict(),
+            "model": self._base_model().state_dict(),
             "optimizer": self.optimizer.state_dict(),
+            "scaler": self.scaler.state_dict() or self.scaler_state,
             "total_epochs": self.total_epochs,
             "losses": self.losses,
             "val_losses": self.val_losses,
             "date": datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
         }
 
-        torch.save(checkpoint, path)
+        torch.save(checkpoint, path, _use_new_zipfile_serialization=True)
     
 
     def load_model(self,
                    path: str,
                    eval_mode: bool = False) -> None:
         """
-        Load the model.
+        Load the model. The checkpoint is memory-mapped and its tensors are loaded
+        directly on the trainer device.
     
         Args:
             path: Path to load the model
         """
 
-        checkpoint = torch.load(path)
+        self._require_optimizer()
 
-        self.model.load_state_dict(checkpoint["model"])
+        # the checkpoint only holds state dicts and plain python values
+        checkpoint = torch.load(path, map_location=self.device, mmap=True, weights_only=True)
+
+        self._base_model().load_state_dict(checkpoint["model"])
         self.optimizer.load_state_dict(checkpoint["optimizer"])
+        if checkpoint.get("scaler"):
+            if self.scaler.is_enabled():
+                self.scaler.load_state_dict(checkpoint["scaler"])
+            else:
+                # applied by `to` once the scaler is enabled
+                self.scaler_state = checkpoint["scaler"]
         self.total_epochs = checkpoint["total_epochs"]
         self.losses = checkpoint["losses"]
         self.val_losses = checkpoint["val_losses"]
@@ -323,7 +772,7 @@ class FakeDetectorTrainer:
         with torch.inference_mode():
             x = x.to(self.device)
             logger.info("Prediction completed.")
-            return self.model(x)
+            return self._forward(x)
         
     def add_graph(self) -> None:
         """
@@ -337,7 +786,7 @@ class FakeDetectorTrainer:
         
         if self.writer:
             logger.info("Graph added to tensorboard.")
-            self.writer.add_graph(self.model, next(iter(self.train_loader))[0].to(self.device))
+            self.writer.add_graph(self._base_model(), next(iter(self.train_loader))[0].to(self.device))
 
     def hook_gradients(self,
                        layers: List[str]) -> None:
@@ -348,7 +797,7 @@ class FakeDetectorTrainer:
             layers: List of layers to hook
         """
 
-        modules = list(self.model.named_modules())
+        modules = list(self._base_model().named_modules())
 
         def make_log_fn(name: str, 
                         id: str) -> Callable[[torch.Tensor], None]:
@@ -1,6 +1,9 @@
 from src.preprocessing import FakeDetectorPreprocessor
+from src.training import FakeDetectorTrainer
+from utils.loader_config import PREFETCH_FACTOR, get_loader_kwargs
 from pathlib import Path
 import torch
+from torch.utils.data import TensorDataset
 from torchvision.datasets import ImageFolder
 
 current_file_path = Path(__file__)
@@ -41,3 +44,61 @@ def test_fake_detector_splits_size():
     assert len(preprocessor.test_loader.dataset) == (0.15 * ImageFolder(root=DATA_PATH, transform=preprocessor.test_transforms))
 
 
+def test_get_loader_kwargs():
+    """
+    Test the `get_loader_kwargs` function:
+        1. Check that persistent workers and the prefetch factor are set with workers.
+        2. Check that neither is passed without workers.
+        3. Check that pinned memory follows CUDA availability.
+    """
+    loader_kwargs = get_loader_kwargs(2)
+    assert loader_kwargs["num_workers"] == 2
+    assert loader_kwargs["persistent_workers"] is True
+    assert loader_kwargs["prefetch_factor"] == PREFETCH_FACTOR
+
+    loader_kwargs = get_loader_kwargs(0)
+    assert loader_kwargs["num_workers"] == 0
+    assert "persistent_workers" not in loader_kwargs
+    assert "prefetch_factor" not in loader_kwargs
+
+    assert loader_kwargs["pin_memory"] == torch.cuda.is_available()
+
+
+def test_build_loaders():
+    """
+    Test the `build_loaders` method of the `FakeDetectorTrainer` class:
+        1. Check the persistent workers and the prefetch factor of the loaders with workers.
+        2. Check that the workers are not persistent without workers.
+        3. Check that the last incomplete train batch is only dropped with `drop_last`.
+    """
+    dataset = TensorDataset(torch.zeros(10, 1), torch.zeros(10))
+
+    train_loader, val_loader = FakeDetectorTrainer.build_loaders(dataset, dataset, batch_size=4, num_workers=2)
+    for loader in (train_loader, val_loader):
+        assert loader.persistent_workers is True
+        assert loader.prefetch_factor == PREFETCH_FACTOR
+
+    train_loader, val_loader = FakeDetectorTrainer.build_loaders(dataset, dataset, batch_size=4, num_workers=0)
+    for loader in (train_loader, val_loader):
+        assert loader.persistent_workers is False
+    assert len(train_loader) == 3
+
+    train_loader, val_loader = FakeDetectorTrainer.build_loaders(dataset, dataset, batch_size=4, num_workers=0,
+                                                                 drop_last=True)
+    assert len(train_loader) == 2
+    assert len(val_loader) == 3
+
+
+def test_fake_detector_drop_last():
+    """
+    Test the `drop_last` argument of the `prepare_data` method of the `FakeDetectorPreprocessor` class:
+        1. Check that the last incomplete train batch is kept by default.
+        2. Check that it is dropped with `drop_last`.
+    """
+    preprocessor = FakeDetectorPreprocessor(DATA_PATH)
+    preprocessor.prepare_data()
+    assert preprocessor.train_loader.drop_last is False
+
+    preprocessor = FakeDetectorPreprocessor(DATA_PATH)
+    preprocessor.prepare_data(drop_last=True)
+    assert preprocessor.train_loader.drop_last is True
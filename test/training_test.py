@@ -0,0 +1,30 @@
+import torch
+from torch import nn
+from torch.utils.data import DataLoader, TensorDataset
+from src.training import FakeDetectorTrainer
+
+
+def test_gradient_accumulation():
+    """
+    Test the gradient accumulation of the `train` method of the `FakeDetectorTrainer` class,
+    with 5 mini batches and `accum_steps=2` (two full groups and a trailing group of one):
+        1. Check the number of optimizer steps.
+        2. Check that every step applies the mean gradient of its group, including the trailing one.
+    """
+
+    torch.manual_seed(42)
+    model = nn.Linear(1, 1, bias=False)
+    optimizer = torch.optim.SGD(model.parameters(), lr=0.1)
+
+    # with inputs of 1 and a sum loss, the gradient of each mini batch is exactly 1
+    step_grads = []
+    optimizer.register_step_pre_hook(lambda opt, args, kwargs: step_grads.append(model.weight.grad.item()))
+
+    trainer = FakeDetectorTrainer(model, optimizer, lambda yhat, y: yhat.sum(), None)
+    trainer.to("cpu")
+    trainer.train_loader = DataLoader(TensorDataset(torch.ones(5, 1), torch.zeros(5, 1)), batch_size=1)
+    trainer.train(1, accum_steps=2)
+
+    assert len(step_grads) == 3
+    for grad in step_grads:
+        assert abs(grad - 1.0) < 1e-6
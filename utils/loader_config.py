@@ -0,0 +1,25 @@
+from typing import Any, Dict
+import torch
+
+PREFETCH_FACTOR = 4
+
+
+def get_loader_kwargs(num_workers: int,
+                      prefetch_factor: int = PREFETCH_FACTOR) -> Dict[str, Any]:
+    """
+    Get the DataLoader arguments shared by the training loaders: pinned memory when
+    CUDA is available, and persistent workers with a larger prefetch factor.
+
+    Args:
+        num_workers (int): Number of workers of the DataLoader.
+        prefetch_factor (int): Number of batches loaded in advance by each worker.
+
+    Returns:
+        Dict[str, Any]: Keyword arguments for the DataLoader.
+    """
+
+    loader_kwargs = {"num_workers": num_workers, "pin_memory": torch.cuda.is_available()}
+    if num_workers > 0:
+        # keep the workers alive across epochs and let them prepare more batches ahead
+        loader_kwargs.update(persistent_workers=True, prefetch_factor=prefetch_factor)
+    return loader_kwargs